@@ -0,0 +1,118 @@
+import asyncio
+import logging
+from config import REFINE_BATCH_SIZE, BATCH_COMPLETION_WINDOW, BATCH_POLL_INTERVAL
+from llm_interactions import prepare_refine_and_extract, refine_and_extract_request, record_refine_and_extract_response, finish_refine_and_extract
+from llm_interactions import json_dumps, json_loads, llm_retry
+from rule_processing import chunk_list, rule_dedupe_key
+
+logger = logging.getLogger(__name__)
+
+# Batch statuses after which the batch will not change any more
+BATCH_FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+@llm_retry
+async def _call_with_retry(method, *args, **kwargs):
+    """
+    Calls a Files/Batches API method, retrying transient failures the way chat completions are
+    retried (the shared client does not retry on its own).
+    """
+    return await method(*args, **kwargs)
+
+async def _cancel_batch(client, batch_id):
+    """Cancels a batch that will no longer be waited for, so it does not keep running (and billing)."""
+    try:
+        await _call_with_retry(client.batches.cancel, batch_id)
+        logger.info("Cancelled batch %s.", batch_id)
+    except Exception as e:
+        logger.warning("Warning: Could not cancel batch %s: %s", batch_id, e)
+
+async def _run_batch_job(client, rows):
+    """
+    Uploads rows as a JSONL input file, submits it to the OpenAI Batch API, and polls until the
+    batch finishes. Returns a dict mapping each row's custom_id to its response content;
+    rows that failed are missing from it.
+    Every API call is retried on transient errors; if polling still fails (or is interrupted),
+    the batch is cancelled before the error propagates.
+    """
+    payload = "\n".join(json_dumps(row) for row in rows).encode("utf-8")
+    input_file = await _call_with_retry(client.files.create, file=("rules2lint_batch.jsonl", payload), purpose="batch")
+    batch = await _call_with_retry(
+        client.batches.create,
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window=BATCH_COMPLETION_WINDOW
+    )
+    logger.info("Submitted batch %s with %s requests. Waiting for it to complete (up to %s)...", batch.id, len(rows), BATCH_COMPLETION_WINDOW)
+
+    try:
+        while batch.status not in BATCH_FINAL_STATUSES:
+            await asyncio.sleep(BATCH_POLL_INTERVAL)
+            batch = await _call_with_retry(client.batches.retrieve, batch.id)
+    except BaseException:
+        await _cancel_batch(client, batch.id)
+        raise
+
+    if batch.status != "completed" or not batch.output_file_id:
+        logger.warning("Warning: Batch %s ended with status '%s' and no usable output.", batch.id, batch.status)
+        return {}
+
+    output = await _call_with_retry(client.files.content, batch.output_file_id)
+    contents = {}
+    for line in output.text.splitlines():
+        if not line.strip():
+            continue
+        row = json_loads(line)
+        body = (row.get("response") or {}).get("body") or {}
+        try:
+            contents[row["custom_id"]] = body["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            logger.warning("Warning: Batch request %s returned no completion: %s", row.get('custom_id'), row.get('error'))
+    return contents
+
+async def run_batch_rule_refinement(client, rules, on_result=None):
+    """
+    Refines rules and extracts their flags through the OpenAI Batch API instead of live requests.
+    Batch requests cost half as much and are not subject to the live rate limits, but can take up
+    to BATCH_COMPLETION_WINDOW to finish, so this suits non-interactive runs.
+    Returns (rule, result) pairs and calls on_result like run_parallel_rule_refinement.
+    """
+    unique_rules = []
+    seen_keys = set()
+    for rule in rules:
+        key = rule_dedupe_key(rule)
+        if key not in seen_keys:
+            seen_keys.add(key)
+            unique_rules.append(rule)
+
+    results, cache_keys = prepare_refine_and_extract(unique_rules)
+    pending = [i for i, result in enumerate(results) if result is None]
+
+    batches = chunk_list(pending, REFINE_BATCH_SIZE)
+    answered = []
+    if batches:
+        rows = [
+            {
+                "custom_id": f"refine-{n}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": refine_and_extract_request([unique_rules[i] for i in batch])
+            }
+            for n, batch in enumerate(batches)
+        ]
+        try:
+            contents = await _run_batch_job(client, rows)
+        except Exception as e:
+            logger.error("Error running OpenAI batch job: %s", e)
+            contents = {}
+        for n, batch in enumerate(batches):
+            answered.extend(record_refine_and_extract_response(unique_rules, results, batch, contents.get(f"refine-{n}")))
+
+    # Rules the batch did not answer fall back to live flag extraction; complete entries are cached after that
+    await finish_refine_and_extract(client, results, cache_keys, answered)
+
+    if on_result:
+        for rule, result in zip(unique_rules, results):
+            on_result(rule, result)
+
+    results_by_key = {rule_dedupe_key(rule): result for rule, result in zip(unique_rules, results)}
+    return [(rule, results_by_key[rule_dedupe_key(rule)]) for rule in rules]
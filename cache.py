@@ -0,0 +1,76 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+def make_cache_key(model, temperature, prompt, version=1):
+    """
+    Builds a stable cache key from the model name, sampling temperature and the full prompt text.
+    Bumping version invalidates entries whose prompt is unchanged but whose meaning is not.
+    """
+    return hashlib.sha256(f"{version}\0{model}\0{temperature}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent on-disk cache for raw LLM response contents, backed by a single SQLite file.
+    The database is opened lazily on first use. Any SQLite error disables the cache for the
+    rest of the run so a broken cache never breaks rule processing.
+    """
+
+    def __init__(self, directory):
+        self.db_path = os.path.join(os.path.expanduser(directory), "responses.sqlite3")
+        self._conn = None
+        self._disabled = False
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path)
+            # WAL lets concurrent runs read while one writes; NORMAL sync is durable enough for a cache
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+        return self._conn
+
+    def _disable(self, error):
+        logger.warning("Warning: Response cache at %s is unavailable (%s). Continuing without cache.", self.db_path, error)
+        self._disabled = True
+
+    def get(self, key):
+        """Returns the cached value for key, or None if it is missing or expired."""
+        if self._disabled:
+            return None
+        try:
+            row = self._connect().execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        except (sqlite3.Error, OSError) as e:
+            self._disable(e)
+            return None
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at < time.time():
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        """Stores value under key. If ttl (seconds) is given, the entry expires after that long."""
+        if self._disabled:
+            return
+        expires_at = time.time() + ttl if ttl else None
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, value, expires_at)
+                )
+        except (sqlite3.Error, OSError) as e:
+            self._disable(e)
@@ -0,0 +1,57 @@
+import time
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Fails fast while an endpoint looks degraded, instead of waiting out a full timeout per call.
+    - CLOSED: requests pass through; `threshold` consecutive failures trip the breaker to OPEN.
+    - OPEN: requests are rejected immediately until `reset_timeout` seconds have passed.
+    - HALF_OPEN: a single probe request is let through; success closes the breaker, failure re-opens it.
+    Not thread-safe; intended for use from a single asyncio event loop.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold=5, reset_timeout=30.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def is_open(self):
+        """
+        Returns True if a request should be rejected right now. Once reset_timeout has elapsed
+        the breaker moves to HALF_OPEN and lets exactly one probe request through.
+        """
+        if self.state == self.CLOSED:
+            return False
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return True
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        if self._probe_in_flight:
+            return True
+        self._probe_in_flight = True
+        return False
+
+    def on_success(self):
+        """Records a successful request and closes the breaker."""
+        self.state = self.CLOSED
+        self._consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def on_failure(self):
+        """Records a failed request, opening the breaker if the threshold is reached or a probe failed."""
+        self._consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self._consecutive_failures >= self.threshold:
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
@@ -1,23 +1,82 @@
 # Configuration constants for rules2lint generation
+import os
 
 # Define templates for no-restricted-syntax based on context
 # Using simplified selectors for broader matching initially
-KEYWORD_TEMPLATES = {
-    "Identifier": lambda kw, rule: {"selector": f"Identifier[name='{kw}']", "message": f"Usage of identifier '{kw}' is restricted by rule: {rule}"},
-    "Literal": lambda kw, rule: {"selector": f"Literal[value='{kw}']", "message": f"Usage of literal '{kw}' is restricted by rule: {rule}"},
-    "Operator": lambda kw, rule: {"selector": f":matches(BinaryExpression, LogicalExpression)[operator='{kw}']", "message": f"Usage of operator '{kw}' is restricted by rule: {rule}"},
-    "Keyword": lambda kw, rule: {"selector": f"{kw.capitalize()}Statement", "message": f"Usage of keyword '{kw}' is restricted by rule: {rule}"}, # Basic guess for keywords like 'try', 'var'
-    "Property": lambda kw, rule: {"selector": f"MemberExpression[property.name='{kw}']", "message": f"Usage of property '{kw}' is restricted by rule: {rule}"},
-    "Import": lambda kw, rule: {"selector": f"ImportDeclaration[source.value='{kw}']", "message": f"Import from '{kw}' is restricted by rule: {rule}"},
+# Selectors and messages are %-format strings filled from a mapping:
+#   %(kw)s = escaped term, %(kw_capitalized)s = escaped term with first letter capitalized, %(rule)s = escaped rule text
+KEYWORD_SELECTORS = {
+    "Identifier": "Identifier[name='%(kw)s']",
+    "Literal": "Literal[value='%(kw)s']",
+    "Operator": ":matches(BinaryExpression, LogicalExpression)[operator='%(kw)s']",
+    "Keyword": "%(kw_capitalized)sStatement", # Basic guess for keywords like 'try', 'var'
+    "Property": "MemberExpression[property.name='%(kw)s']",
+    "Import": "ImportDeclaration[source.value='%(kw)s']",
     # Default/fallback template
-    "Unknown": lambda kw, rule: {"selector": f":matches(Identifier[name='{kw}'], Literal[value='{kw}'])", "message": f"Usage of '{kw}' is restricted by rule: {rule} (context unknown)"}
+    "Unknown": ":matches(Identifier[name='%(kw)s'], Literal[value='%(kw)s'])"
+}
+KEYWORD_MESSAGES = {
+    "Identifier": "Usage of identifier '%(kw)s' is restricted by rule: %(rule)s",
+    "Literal": "Usage of literal '%(kw)s' is restricted by rule: %(rule)s",
+    "Operator": "Usage of operator '%(kw)s' is restricted by rule: %(rule)s",
+    "Keyword": "Usage of keyword '%(kw)s' is restricted by rule: %(rule)s",
+    "Property": "Usage of property '%(kw)s' is restricted by rule: %(rule)s",
+    "Import": "Import from '%(kw)s' is restricted by rule: %(rule)s",
+    "Unknown": "Usage of '%(kw)s' is restricted by rule: %(rule)s (context unknown)"
 }
 
 # Potentially add other constants here later, like model names, timeouts, etc.
+# Model for the structured-output calls (first-pass filter, refine+extract, extract). These are narrow
+# JSON-schema tasks where gpt-4o-mini performs close to gpt-4o at a fraction of the cost and latency;
+# set RULES2LINT_MODEL=gpt-4o if you see quality regressions.
+# A fine-tuned model ID ("ft:...") here drops the few-shot examples from that stage's prompt
+MODEL_NAME = os.environ.get("RULES2LINT_MODEL", "gpt-4o-mini")
+# Stronger filter model that only sees the lines the first pass was unsure about
 MODEL_NAME_FILTER = "gpt-4o"
-MODEL_NAME_REFINE = "gpt-4o"
-MODEL_NAME_EXTRACT = "gpt-4o"
-API_TIMEOUT_FILTER = 60.0
-API_TIMEOUT_REFINE = 60.0
-API_TIMEOUT_EXTRACT = 45.0
-MAX_WORKERS = 8 
\ No newline at end of file
+MODEL_NAME_FILTER_FAST = MODEL_NAME
+MODEL_NAME_REFINE = MODEL_NAME
+MODEL_NAME_EXTRACT = MODEL_NAME
+# Per-request timeouts in seconds, each overridable with a RULES2LINT_<NAME> environment variable.
+# Refine/extract requests carry a whole batch of rules and their output budget grows with it, so they
+# get API_TIMEOUT_PER_RULE on top of their base timeout for every rule in the request.
+API_TIMEOUT_FILTER = float(os.environ.get("RULES2LINT_API_TIMEOUT_FILTER", 30.0))
+API_TIMEOUT_REFINE = float(os.environ.get("RULES2LINT_API_TIMEOUT_REFINE", 30.0))
+API_TIMEOUT_EXTRACT = float(os.environ.get("RULES2LINT_API_TIMEOUT_EXTRACT", 20.0))
+API_TIMEOUT_PER_RULE = float(os.environ.get("RULES2LINT_API_TIMEOUT_PER_RULE", 5.0))
+TEMPERATURE_FILTER = 0.0
+TEMPERATURE_REFINE = 0.2
+TEMPERATURE_EXTRACT = 0.1
+# Output token caps: whole filter response (raised for large inputs), and per rule in a refine / extract batch
+MAX_TOKENS_FILTER = 4096
+MAX_TOKENS_REFINE = 512
+MAX_TOKENS_EXTRACT = 512
+# Most output tokens the models accept in a single response (gpt-4o / gpt-4o-mini); every request's budget is clamped to it
+MAX_OUTPUT_TOKENS = 16384
+# Upper bound on in-flight LLM requests (asyncio semaphore size); override with RULES2LINT_MAX_CONCURRENT_REQUESTS
+MAX_CONCURRENT_REQUESTS = int(os.environ.get("RULES2LINT_MAX_CONCURRENT_REQUESTS", 64))
+# Request pacing in front of every LLM call: starts per minute (RULES2LINT_REQUESTS_PER_MINUTE; match your
+# account's RPM limit), and consecutive successes before a rate-limited (halved) in-flight cap grows by one again
+REQUESTS_PER_MINUTE = int(os.environ.get("RULES2LINT_REQUESTS_PER_MINUTE", 500))
+CONCURRENCY_INCREASE_AFTER = 10
+# Idle connections kept open in the shared HTTP connection pool, and seconds each may stay idle
+# (httpx closes them after 5 s by default, which drops warm connections between pipeline stages)
+MAX_KEEPALIVE_CONNECTIONS = 32
+KEEPALIVE_EXPIRY = 60.0
+# Circuit breaker: consecutive failures before failing fast, and seconds before probing again
+CIRCUIT_BREAKER_THRESHOLD = 5
+CIRCUIT_BREAKER_RESET_TIMEOUT = 30.0
+# Number of input lines sent in each (concurrent) filter request
+FILTER_CHUNK_SIZE = 40
+# Number of rules packed into a single refine+extract request
+REFINE_BATCH_SIZE = 15
+# OpenAI Batch API (--batch): completion window, and seconds between status checks
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_POLL_INTERVAL = 30.0
+
+# Persistent response cache (SQLite file inside CACHE_DIR); override the location with RULES2LINT_CACHE_DIR
+CACHE_DIR = os.environ.get("RULES2LINT_CACHE_DIR", "~/.rules2lint/cache")
+CACHE_TTL_SECONDS = 7 * 86400
+# Part of every cache key; bump it when the handling of cached responses changes without a prompt change
+CACHE_PROMPT_VERSION = 1
+# Responses sampled above this temperature are not deterministic enough to reuse
+CACHE_MAX_TEMPERATURE = 0.2
\ No newline at end of file
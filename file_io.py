@@ -1,5 +1,10 @@
 import os
 import json
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
 
 def read_rules_file(filepath):
     """Reads the rules file and returns a list of non-empty lines."""
@@ -16,37 +21,18 @@ def read_rules_file(filepath):
         raise IOError(f"Error reading rules file {filepath}: {e}")
 
 
-def write_eslint_config_file(output_filepath, final_rules_object, highest_severity, rule_count, processed_rule_count, untranslated_rules):
-    """Writes the final eslint.config.mjs file."""
-    # Delete existing config file using full path
-    try:
-        if os.path.exists(output_filepath):
-            os.remove(output_filepath)
-            print(f"Deleted existing {output_filepath}")
-    except OSError as e:
-        print(f"Warning: Could not delete existing {output_filepath}: {e}")
-
-    # Check if we actually generated any rules
-    if not final_rules_object:
-         print(f"\nNo rule configurations were generated. Skipping writing {output_filepath}.")
-         return
-
-    try:
-        # Use indent=2 for readability in the final JS file
-        final_rules_js_string = json.dumps(final_rules_object, indent=2)
-        # Add indentation to each line of the JSON string for proper embedding in the JS template
-        indented_final_rules_js_string = "\n".join("    " + line for line in final_rules_js_string.splitlines())
-
-    except TypeError as e:
-        print(f"Error: Failed to serialize final rules to JSON: {e}")
-        return
-
-    # Construct the content for eslint.config.mjs
-    final_config_content = f"""
+# Everything before the restricted syntax configs: they are appended one by one to this array
+ESLINT_CONFIG_PRELUDE = """
 // ESLint Flat Configuration generated by rules2lint-lite
 // Documentation: https://eslint.org/docs/latest/use/configure/configuration-files
 // Generated based on rules in .cursorrules
 
+const restrictedSyntax = [
+"""
+
+# Everything after the configs; filled with the overall severity once every rule is processed
+ESLINT_CONFIG_EPILOGUE = """];
+
 export default [
   {{
     // You might want to restrict files this applies to:
@@ -62,22 +48,134 @@ export default [
     }},
     // Consider adding plugins if your rules rely on them
 
-    rules: {indented_final_rules_js_string}
+    rules: {{
+      "no-restricted-syntax": [{severity}, ...restrictedSyntax]
+    }}
   }}
 ];
 """
 
-    try:
-        # Write the output file using full path
-        with open(output_filepath, 'w', encoding='utf-8') as f:
-            f.write(final_config_content)
-        print(f"\nSuccessfully generated {output_filepath} with {rule_count} restricted syntax configurations under 'no-restricted-syntax'.")
-        print(f"(Overall severity set to '{highest_severity}' based on input rules).")
+class EslintConfigWriter:
+    """
+    Context manager that streams the eslint.config.mjs file to disk while rules are processed.
+    append() only queues a config; a single background thread dedupes configs by selector, tracks
+    the highest severity, and writes (and flushes) each new config, so the event loop producing
+    them never waits on disk I/O. On exit the queue is drained and the closing part of the file,
+    with the highest severity seen, is written. The epilogue is also written when processing is interrupted (e.g. by Ctrl-C), so the
+    file is always a valid, possibly partial, config.
+    An exception while writing stops further writes, but the queue is still drained and the epilogue
+    still written; the exception is then re-raised on exit.
+    The existing config file is only replaced once the first config is written; a run that
+    generates nothing leaves it untouched.
+    Callers record the number of refined rules in processed_rule_count and the rules that could
+    not be translated in untranslated_rules; both are reported when the file is closed.
+    """
+
+    def __init__(self, output_filepath):
+        self.output_filepath = output_filepath
+        self.highest_severity = "warn" # Elevated to error if any flag is error
+        self.rule_count = 0
+        self.processed_rule_count = 0
+        self.untranslated_rules = []
+        self._seen_selectors = set()
+        self._file = None
+        self._queue = queue.SimpleQueue() # (severity, config) items; None tells the consumer to stop
+        self._consumer = threading.Thread(target=self._consume, name="rules2lint-config-writer", daemon=True)
+        self._write_error = None
+
+    def __enter__(self):
+        self._consumer.start()
+        return self
+
+    def _consume(self):
+        """Consumer thread: writes queued configs until the None sentinel arrives."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self._write_error is not None:
+                continue # Keep draining; the error is reported on exit
+            try:
+                self._write(*item)
+            except Exception as e:
+                self._write_error = e
+
+    def _open(self):
+        """Replaces any existing config file and writes the prelude. Called on the first append."""
+        try:
+            if os.path.exists(self.output_filepath):
+                os.remove(self.output_filepath)
+                logger.info("Deleted existing %s", self.output_filepath)
+        except OSError as e:
+            logger.warning("Warning: Could not delete existing %s: %s", self.output_filepath, e)
+        self._file = open(self.output_filepath, 'w', encoding='utf-8')
+        self._file.write(ESLINT_CONFIG_PRELUDE)
+
+    def append(self, severity, config):
+        """Queues one restricted syntax config to be written, unless its selector was already written."""
+        self._queue.put((severity, config))
+
+    def _write(self, severity, config):
+        selector = config["selector"]
+        if selector in self._seen_selectors:
+            return
+        try:
+            # Use indent=2 for readability, nested one level inside the array
+            config_js_string = json.dumps(config, indent=2)
+        except TypeError as e:
+            logger.error("Error: Failed to serialize config to JSON: %s", e)
+            return
+        if self._file is None:
+            self._open()
+        self._file.write("\n".join("  " + line for line in config_js_string.splitlines()) + ",\n")
+        self._file.flush() # Let the user follow progress in the file itself
+        self._seen_selectors.add(selector)
+        self.rule_count += 1
+        if severity == "error":
+            self.highest_severity = "error"
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Let the consumer finish everything queued so far
+        self._queue.put(None)
+        self._consumer.join()
+
+        if self._file is not None:
+            # Closed even after a write error, so the configs written so far still form a valid file
+            try:
+                self._file.write(ESLINT_CONFIG_EPILOGUE.format(severity=json.dumps(self.highest_severity)))
+                if self.untranslated_rules:
+                    self._file.write("\n// Rules that could not be translated into concrete checks:\n")
+                    for rule in self.untranslated_rules:
+                        self._file.write(f"//   - {' '.join(rule.splitlines())}\n")
+                self._file.close()
+            except OSError as e:
+                if self._write_error is None:
+                    self._write_error = e
+
+        if self._write_error is not None:
+            if exc_type is None:
+                raise self._write_error
+            # Do not mask the exception already propagating
+            print(f"Error: Failed to write {self.output_filepath}: {self._write_error}")
+            return False
+
+        if self._file is None:
+            # Nothing generated: an existing config is only replaced once there is something to replace it with
+            if exc_type is None:
+                print(f"\nNo rule configurations were generated. Skipping writing {self.output_filepath}.")
+            return False
+
+        if exc_type is not None:
+            print(f"\nProcessing was interrupted; {self.output_filepath} holds the {self.rule_count} restricted syntax configurations generated so far.")
+            return False
+
+        print(f"\nSuccessfully generated {self.output_filepath} with {self.rule_count} restricted syntax configurations under 'no-restricted-syntax'.")
+        print(f"(Overall severity set to '{self.highest_severity}' based on input rules).")
 
         # Report statistics
-        print(f"Derived from {processed_rule_count} refined rules processed.")
-        if untranslated_rules:
-             print(f"{len(untranslated_rules)} original rules were marked as untranslatable.")
+        print(f"Derived from {self.processed_rule_count} refined rules processed.")
+        if self.untranslated_rules:
+             print(f"{len(self.untranslated_rules)} original rules were marked as untranslatable.")
 
         # Add reminder for IDE linting
         print("\n---")
@@ -88,6 +186,4 @@ export default [
         print("   3. Wait a few seconds - the ESLint extension should now detect the changes.")
         print("   (If still no errors, check the 'ESLint' section in the Output panel for clues).")
         print("---")
-
-    except IOError as e:
-        print(f"Error: Failed to write {output_filepath}: {str(e)}") 
\ No newline at end of file
+        return False
@@ -1,13 +1,156 @@
-import json
-from tqdm import tqdm
-from config import MODEL_NAME_FILTER, API_TIMEOUT_FILTER, MODEL_NAME_REFINE, API_TIMEOUT_REFINE, MODEL_NAME_EXTRACT, API_TIMEOUT_EXTRACT
-
-def llm_filter_rules(client, raw_lines):
-    """Uses LLM to filter raw lines into lintable rules and non-rules."""
-    print("\nFiltering rules using LLM (inclusive approach)...")
-    input_text = "\n".join(raw_lines)
+import asyncio
+import logging
+from openai import RateLimitError, APITimeoutError, APIConnectionError, InternalServerError
+from pydantic import ValidationError
+from tenacity import retry, stop_after_attempt, wait_random_exponential, retry_if_exception_type
+from config import MODEL_NAME_FILTER, MODEL_NAME_FILTER_FAST, API_TIMEOUT_FILTER, MODEL_NAME_REFINE, API_TIMEOUT_REFINE, MODEL_NAME_EXTRACT, API_TIMEOUT_EXTRACT, API_TIMEOUT_PER_RULE
+from config import TEMPERATURE_FILTER, TEMPERATURE_REFINE, TEMPERATURE_EXTRACT, CACHE_DIR, CACHE_TTL_SECONDS, CACHE_MAX_TEMPERATURE, CACHE_PROMPT_VERSION
+from config import CIRCUIT_BREAKER_THRESHOLD, CIRCUIT_BREAKER_RESET_TIMEOUT, REQUESTS_PER_MINUTE, CONCURRENCY_INCREASE_AFTER
+from config import FILTER_CHUNK_SIZE, REFINE_BATCH_SIZE, MAX_CONCURRENT_REQUESTS, MAX_TOKENS_FILTER, MAX_TOKENS_REFINE, MAX_TOKENS_EXTRACT, MAX_OUTPUT_TOKENS
+from cache import ResponseCache, make_cache_key
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from local_rules import local_prefilter, try_local_extract
+from rate_limiter import AdaptiveRateLimiter
+from response_models import FilterResponse, RefineAndExtractResponse, ExtractResponse, flags_from_dicts
+from streaming_json import StringArrayStreamParser
+
+try:
+    # optional; parses and serializes cached entries and batch files several times faster
+    from orjson import loads as json_loads, dumps as _orjson_dumps
+
+    def json_dumps(obj):
+        return _orjson_dumps(obj).decode("utf-8")
+except ImportError:
+    from json import loads as json_loads, dumps as json_dumps
+
+logger = logging.getLogger(__name__)
+
+def _log_failure(msg, *args, level=logging.ERROR):
+    """Logs a handled failure from inside its except block; the traceback is only attached at debug level."""
+    logger.log(level, msg, *args, exc_info=logger.isEnabledFor(logging.DEBUG))
+
+# Shared persistent cache for deterministic (low-temperature) LLM responses
+response_cache = ResponseCache(CACHE_DIR)
+
+_backoff_wait = wait_random_exponential(min=1, max=30)
+# Longest server-requested delay we are willing to honor, in seconds
+MAX_RETRY_AFTER = 60.0
+
+def _retry_after_seconds(exc):
+    """Returns the delay requested by the response's Retry-After headers, or None if absent/unparseable."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass # HTTP-date form; fall back to backoff
+    return None
+
+def _wait_retry_after_or_backoff(retry_state):
+    """Waits as long as the server asked (Retry-After), otherwise uses jittered exponential backoff."""
+    retry_after = _retry_after_seconds(retry_state.outcome.exception())
+    if retry_after is not None:
+        return min(max(retry_after, 0.0), MAX_RETRY_AFTER)
+    return _backoff_wait(retry_state)
+
+# Retries transient OpenAI failures (rate limits, timeouts, dropped connections, 5xx errors), honoring
+# Retry-After when the server sends it; the original exception is re-raised once attempts are exhausted.
+llm_retry = retry(
+    wait=_wait_retry_after_or_backoff,
+    stop=stop_after_attempt(5),
+    retry=retry_if_exception_type((RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)),
+    reraise=True
+)
+
+# Errors that indicate the endpoint itself is degraded (as opposed to a bad request)
+ENDPOINT_FAILURE_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+
+# One circuit breaker per model endpoint, shared by every call in the run
+_circuit_breakers = {}
+
+def _circuit_breaker_for(model):
+    if model not in _circuit_breakers:
+        _circuit_breakers[model] = CircuitBreaker(CIRCUIT_BREAKER_THRESHOLD, CIRCUIT_BREAKER_RESET_TIMEOUT)
+    return _circuit_breakers[model]
+
+# Token usage summed over every completion of the run. cached_tokens counts prompt tokens served
+# from OpenAI's automatic prompt cache, which only applies to a static prefix of 1024+ tokens.
+# Only SYSTEM_PROMPT_REFINE_AND_EXTRACT (~1600 tokens) is that long, so refine+extract requests are
+# the ones that hit the cache; the filter (~700) and extract (~860) prompts are too short for it.
+token_usage = {"prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+
+def _record_usage(usage):
+    """Adds a response's usage (None if the response carried none) to token_usage."""
+    if usage is None:
+        return
+    token_usage["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+    token_usage["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    token_usage["cached_tokens"] += getattr(details, "cached_tokens", 0) or 0
+
+# Paces every request attempt (retries included) and backs the in-flight cap off on 429s
+request_limiter = AdaptiveRateLimiter(
+    REQUESTS_PER_MINUTE,
+    MAX_CONCURRENT_REQUESTS,
+    throttle_errors=(RateLimitError,),
+    increase_after=CONCURRENCY_INCREASE_AFTER
+)
+
+@llm_retry
+async def _create_completion_with_retry(client, **request_kwargs):
+    # A streamed response frees its slot once the response starts, not when it ends
+    async with request_limiter.slot():
+        return await client.chat.completions.create(**request_kwargs)
+
+async def _create_completion(client, **request_kwargs):
+    """
+    Sends a single chat completion request, retrying transient failures.
+    Raises CircuitOpenError without calling the API while the model's endpoint is considered down,
+    so callers drop straight into their fallback path.
+    """
+    model = request_kwargs["model"]
+    breaker = _circuit_breaker_for(model)
+    if breaker.is_open():
+        raise CircuitOpenError(f"Circuit breaker open for model '{model}'; skipping request")
+    try:
+        response = await _create_completion_with_retry(client, **request_kwargs)
+    except ENDPOINT_FAILURE_ERRORS:
+        breaker.on_failure()
+        raise
+    except Exception:
+        breaker.on_success() # The endpoint answered; the request itself was the problem
+        raise
+    breaker.on_success()
+    if not request_kwargs.get("stream"):
+        _record_usage(getattr(response, "usage", None))
+    return response
+
+def _timeout_for(base_timeout, rule_count):
+    """Returns the timeout for a request carrying rule_count rules, whose output budget grows with each rule."""
+    return base_timeout + API_TIMEOUT_PER_RULE * rule_count
+
+def _cache_key_for(model, prompt, temperature):
+    """Returns the response cache key for a request, or None if its temperature is too high to cache."""
+    if temperature > CACHE_MAX_TEMPERATURE:
+        return None
+    return make_cache_key(model, temperature, prompt, version=CACHE_PROMPT_VERSION)
+
+def _system_prompt(instructions, examples, model):
+    """
+    Builds a system prompt from its instructions and few-shot examples. Fine-tuned models
+    ("ft:..." IDs) have already learned the task, so they get the instructions alone and
+    skip paying for the example tokens on every call.
+    """
+    if model.startswith("ft:"):
+        return instructions
+    return instructions + examples
 
-    prompt = f"""
+FILTER_INSTRUCTIONS = """
 Analyze the following lines from a rule configuration file. Your goal is to identify lines that express **any** preference, constraint, style guide, naming convention, or prohibition that could **potentially** be enforced by a linter like ESLint by **flagging specific keywords, literals, operators or patterns**. Assume users may not phrase rules perfectly.
 
 **Bias towards including lines unless they are clearly NOT rules or cannot be mapped to specific flags.**
@@ -28,7 +171,9 @@ Filter out **ONLY** lines that are:
 Return the results as a JSON object with two keys:
 - "lintable_rules": A list of strings, where each string is a line identified as a potentially lintable rule according to the inclusive criteria above.
 - "filtered_out": A list of strings, containing only the lines that were clearly filtered out based on the strict exclusion criteria.
+"""
 
+FILTER_EXAMPLES = """
 Example Input Lines:
 # Use strict equality
 Use === instead of ==
@@ -40,7 +185,7 @@ No console.log statements allowed
 ALWAYS VALIDATE implementation with the USER
 
 Example JSON Output:
-{{
+{
   "lintable_rules": [
     "Use === instead of ==",
     "- Do NOT hardcode anything",
@@ -54,58 +199,210 @@ Example JSON Output:
     "Write clear variable names",
     "ALWAYS VALIDATE implementation with the USER"
   ]
-}}
-
-Input Lines:
----
-{input_text}
----
+}
+"""
 
-Respond ONLY with the JSON object.
+FILTER_UNCERTAIN_INSTRUCTIONS = """
+Additionally, return a third key:
+- "uncertain_lines": A list of strings, containing the lines you cannot confidently classify as either lintable or filtered out. Put each such line ONLY in "uncertain_lines", not in the other two lists. Leave it empty when every line is clear.
 """
 
-    json_schema = {
-        "name": "filtered_rules_response",
-        "schema": {
-            "type": "object",
-            "properties": {
-                "lintable_rules": {"type": "array", "items": {"type": "string"}},
-                "filtered_out": {"type": "array", "items": {"type": "string"}}
-            },
-            "required": ["lintable_rules", "filtered_out"]
-        }
+SYSTEM_PROMPT_FILTER = _system_prompt(FILTER_INSTRUCTIONS, FILTER_EXAMPLES, MODEL_NAME_FILTER)
+SYSTEM_PROMPT_FILTER_FAST = _system_prompt(FILTER_INSTRUCTIONS + FILTER_UNCERTAIN_INSTRUCTIONS, FILTER_EXAMPLES, MODEL_NAME_FILTER_FAST)
+
+FILTER_JSON_SCHEMA = {
+    "name": "filtered_rules_response",
+    "schema": {
+        "type": "object",
+        "properties": {
+            "lintable_rules": {"type": "array", "items": {"type": "string"}},
+            "filtered_out": {"type": "array", "items": {"type": "string"}}
+        },
+        "required": ["lintable_rules", "filtered_out"]
+    }
+}
+
+# The fast first pass may also set lines aside as uncertain; only those are escalated
+FILTER_FAST_JSON_SCHEMA = {
+    "name": "filtered_rules_response",
+    "schema": {
+        "type": "object",
+        "properties": {
+            "lintable_rules": {"type": "array", "items": {"type": "string"}},
+            "filtered_out": {"type": "array", "items": {"type": "string"}},
+            "uncertain_lines": {"type": "array", "items": {"type": "string"}}
+        },
+        "required": ["lintable_rules", "filtered_out", "uncertain_lines"]
     }
+}
 
+FILTER_RESPONSE_FORMAT = {"type": "json_schema", "json_schema": FILTER_JSON_SCHEMA}
+FILTER_FAST_RESPONSE_FORMAT = {"type": "json_schema", "json_schema": FILTER_FAST_JSON_SCHEMA}
+
+async def _request_filter(client, model, system_prompt, response_format, lines, result_json):
+    """
+    Async generator that runs one filter request over lines with the given model and yields each
+    lintable rule as soon as its JSON string is complete in the streamed response. Falls back to a
+    non-streaming request if streaming fails, and raises if that fails too. Responses are cached,
+    so an unchanged input is answered from the cache without a request.
+    Once exhausted, result_json (a dict) holds the fully parsed response object.
+    """
+    input_text = "\n".join(lines)
+    # The response echoes input lines back (~4 characters per token), so large inputs get room
+    # beyond the base cap instead of being truncated mid-JSON
+    max_tokens = min(max(MAX_TOKENS_FILTER, len(input_text) // 2), MAX_OUTPUT_TOKENS)
+    messages = [
+        {"role": "system", "content": system_prompt},
+        # Variable content goes last so the system prefix stays byte-identical across calls
+        {"role": "user", "content": f"Input Lines:\n---\n{input_text}\n---\n\nRespond ONLY with the JSON object."}
+    ]
+
+    cache_key = _cache_key_for(model, system_prompt + "\0" + input_text, TEMPERATURE_FILTER)
+    content = response_cache.get(cache_key) if cache_key else None
+    if content is not None:
+        result_json.update(json_loads(content))
+        for rule in result_json.get("lintable_rules", []):
+            yield rule
+        return
+
+    parser = StringArrayStreamParser("lintable_rules")
     try:
-        response = client.chat.completions.create(
-            model=MODEL_NAME_FILTER,
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_schema", "json_schema": json_schema},
-            timeout=API_TIMEOUT_FILTER
+        stream = await _create_completion(
+            client,
+            model=model,
+            messages=messages,
+            response_format=response_format,
+            temperature=TEMPERATURE_FILTER,
+            max_tokens=max_tokens,
+            timeout=API_TIMEOUT_FILTER,
+            stream=True,
+            stream_options={"include_usage": True} # Usage arrives in a final chunk without choices
         )
-        result_json = json.loads(response.choices[0].message.content)
-        lintable = result_json.get("lintable_rules", [])
-        filtered = result_json.get("filtered_out", [])
-        print(f"LLM filtering complete. Found {len(lintable)} potential rules.")
-        return lintable, filtered
-    except (json.JSONDecodeError, IndexError, AttributeError) as e:
-        print(f"Error parsing LLM filter response: {e}. Proceeding without filtering.")
-        return raw_lines, [] # Fallback: treat all lines as lintable, none filtered
+        async for chunk in stream:
+            _record_usage(getattr(chunk, "usage", None))
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                for rule in parser.feed(delta):
+                    yield rule
+        result_json.update(FilterResponse.model_validate_json(parser.text).model_dump())
+        content = parser.text
     except Exception as e:
-        print(f"Error calling OpenAI API for filtering: {e}. Proceeding without filtering.")
-        return raw_lines, [] # Fallback
+        _log_failure("Warning: Streaming LLM filter response from %s failed (%s). Retrying without streaming.", model, e, level=logging.WARNING)
+
+    if content is None:
+        response = await _create_completion(
+            client,
+            model=model,
+            messages=messages,
+            response_format=response_format,
+            temperature=TEMPERATURE_FILTER,
+            max_tokens=max_tokens,
+            timeout=API_TIMEOUT_FILTER
+        )
+        content = response.choices[0].message.content
+        result_json.update(FilterResponse.model_validate_json(content).model_dump())
+        for rule in result_json.get("lintable_rules", []):
+            yield rule
 
-def llm_refine_rule(client, rule_text):
-    """Uses LLM to refine a potentially complex rule into simpler, more concrete rules."""
-    prompt = f"""
-Analyze the input coding rule.
+    if cache_key:
+        response_cache.set(cache_key, content, ttl=CACHE_TTL_SECONDS)
 
-Determine if the rule is:
+async def _filter_chunk(client, lines, publish):
+    """
+    Filters one chunk of lines through the model cascade: MODEL_NAME_FILTER_FAST classifies every
+    line and only the lines it reports as uncertain are re-classified by MODEL_NAME_FILTER.
+    Lintable rules are passed to the async callback publish as soon as they are parsed.
+    Returns (lintable, filtered) for the chunk.
+    """
+    result_json = {}
+    try:
+        async for rule in _request_filter(client, MODEL_NAME_FILTER_FAST, SYSTEM_PROMPT_FILTER_FAST, FILTER_FAST_RESPONSE_FORMAT, lines, result_json):
+            await publish(rule)
+        lintable = list(result_json.get("lintable_rules", []))
+        filtered = list(result_json.get("filtered_out", []))
+        uncertain = result_json.get("uncertain_lines", [])
+    except Exception as e:
+        _log_failure("Error during fast LLM filtering with %s: %s. Escalating %s lines to %s.", MODEL_NAME_FILTER_FAST, e, len(lines), MODEL_NAME_FILTER)
+        lintable, filtered, uncertain = [], [], lines
+
+    if uncertain:
+        logger.info("Escalating %s uncertain lines to %s...", len(uncertain), MODEL_NAME_FILTER)
+        result_json = {}
+        try:
+            async for rule in _request_filter(client, MODEL_NAME_FILTER, SYSTEM_PROMPT_FILTER, FILTER_RESPONSE_FORMAT, uncertain, result_json):
+                await publish(rule)
+            lintable.extend(result_json.get("lintable_rules", []))
+            filtered.extend(result_json.get("filtered_out", []))
+        except Exception as e:
+            _log_failure("Error during LLM filtering with %s: %s. Treating uncertain lines as lintable.", MODEL_NAME_FILTER, e)
+            lintable.extend(uncertain) # Fallback: bias towards including lines
+    return lintable, filtered
+
+async def stream_filtered_rules(client, raw_lines, filtered_out):
+    """
+    Uses LLM to filter raw lines into lintable rules and non-rules, as an async generator.
+    Obvious non-rules are removed locally first (see local_rules.local_prefilter). The rest is split
+    into chunks of FILTER_CHUNK_SIZE lines that are filtered concurrently (see _filter_chunk).
+    Each lintable rule is yielded (once) as soon as it has been parsed from a streamed response, so
+    later stages can start before filtering finishes. Lines that are not rules are appended to
+    the filtered_out list, in input order.
+    """
+    # Obvious non-rules never need to reach the LLM
+    lines, prefiltered = local_prefilter(raw_lines)
+    filtered_out.extend(prefiltered)
+    if not lines:
+        return
+
+    chunks = [lines[i:i + FILTER_CHUNK_SIZE] for i in range(0, len(lines), FILTER_CHUNK_SIZE)]
+    logger.info("Filtering rules using LLM (inclusive approach, %s concurrent requests)...", len(chunks))
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    rule_queue = asyncio.Queue()
+
+    async def _filter_limited(chunk):
+        async with semaphore:
+            return await _filter_chunk(client, chunk, rule_queue.put)
+
+    async def _filter_all():
+        try:
+            # gather keeps the chunk results in input order
+            return await asyncio.gather(*(_filter_limited(chunk) for chunk in chunks))
+        finally:
+            await rule_queue.put(None) # Signal that every chunk has finished
+
+    filter_task = asyncio.ensure_future(_filter_all())
+    yielded = set()
+    try:
+        while True:
+            rule = await rule_queue.get()
+            if rule is None:
+                break
+            if rule not in yielded:
+                yielded.add(rule)
+                yield rule
+        chunk_results = await filter_task
+    finally:
+        if not filter_task.done():
+            filter_task.cancel() # The consumer stopped early
+
+    for lintable, filtered in chunk_results:
+        filtered_out.extend(filtered)
+        # Yield anything the incremental parser did not already emit
+        for rule in lintable:
+            if rule not in yielded:
+                yielded.add(rule)
+                yield rule
+    logger.info("LLM filtering complete. Found %s potential rules.", len(yielded))
+
+REFINE_AND_EXTRACT_INSTRUCTIONS = """
+Analyze each of the input coding rules independently. For every rule, first refine it into simple rules that each focus on a specific term, then identify the terms to flag in code using ESLint's `no-restricted-syntax` for each of those simple rules.
+
+Step 0 - Check. Input lines are not always rules. If a line is clearly NOT a coding rule (a comment, a section header or purely organizational text, or an instruction directed at humans/AI assistants rather than at code, e.g. "Always validate with the user"), use the outcome "not_a_rule" for it and skip the remaining steps.
+
+Step 1 - Refine. Determine if a rule is:
 a) Simple and directly actionable by flagging specific terms: Describes a specific keyword, function name, variable name, literal, or operator (e.g., 'Use === instead of ==', 'No console.log', 'Avoid Math.random', 'Disallow "SECRET_KEY"').
 b) Complex or Abstract: Describes a broader principle or prohibition that might require translation into specific terms to flag (e.g., 'Do NOT hardcode anything', 'No mock data', 'Tests should not reimplement core logic', 'Latest model is gpt-4o').
 
-Your Task:
-1.  If the rule is **Simple (a)**, return it unchanged.
+1.  If the rule is **Simple (a)**, keep it unchanged.
 2.  If the rule is **Complex/Abstract (b)**, attempt to break it down into ONE or MORE simpler rules, where *each simpler rule focuses on a specific term* (keyword, literal, identifier, operator) that should be flagged.
     *   **Focus on tangible terms**: "fallback", "mock", "==", "||", "random", "SECRET_KEY", "/mocks/", "try".
     *   **Example Breakdown**:
@@ -116,85 +413,67 @@ Your Task:
         - 'WE DONT USE FALLBACKS. EVER.' -> ["Disallow the '||' operator", "Disallow the '??' operator", "Disallow empty 'catch' blocks (keyword 'try')", "Disallow identifiers named 'fallback'"]
 3.  If a Complex/Abstract rule **cannot be reasonably broken down** into concrete terms to flag, indicate it is untranslatable.
 
-Output Format:
-Return ONLY a JSON object with the following keys:
-- "outcome": A string, either "passed_through" (for simple rules), "translated" (if successfully broken down), or "untranslatable".
-- "refined_rules": A list of strings. Contains the original rule if "outcome" is "passed_through", or the list of new, simpler rule strings if "outcome" is "translated", or an empty list if "outcome" is "untranslatable". Each refined rule should ideally focus on one specific term/pattern to flag.
-
-Example 1:
-Input Rule: "Use === instead of =="
-Output: {{"outcome": "passed_through", "refined_rules": ["Use === instead of =="]}}
-
-Example 2:
-Input Rule: "Do not hardcode API keys"
-Output: {{"outcome": "translated", "refined_rules": ["Disallow string literals containing 'KEY'", "Disallow string literals containing 'SECRET'", "Flag assignments to variables named 'apiKey'", "Flag assignments to variables named 'secretKey'"]}}
-
-Example 3:
-Input Rule: "Tests should be easy to understand"
-Output: {{"outcome": "untranslatable", "refined_rules": []}}
-
-Example 4:
-Input Rule: "WE DONT USE FALLBACKS. EVER."
-Output: {{"outcome": "translated", "refined_rules": ["Disallow the '||' operator", "Disallow the '??' operator", "Disallow empty 'catch' blocks", "Disallow identifiers named 'fallback'"]}}
+Step 2 - Extract flags, for every simple rule produced in Step 1:
+1.  Identify **specific, concrete terms** (keywords, variable names, function names, string literals, operators like '||', '??', '==') mentioned or clearly implied by the simple rule that should be disallowed or warned against.
+2.  For each term, determine its most likely **syntactic context**:
+    *   `Identifier`: A variable name, function name, object key (e.g., `fallback`, `mockData`, `Math`).
+    *   `Literal`: A specific string or number value (e.g., `"SECRET_KEY"`, `500`, `"gpt-3.5-turbo"`).
+    *   `Operator`: A comparison, logical, or assignment operator (e.g., `==`, `||`, `??`).
+    *   `Keyword`: A JavaScript language keyword (e.g., `var`, `try`, `debugger`).
+    *   `Property`: Accessing a property of an object (e.g., `random` in `Math.random`).
+    *   `Import`: Importing from a specific path/module name.
+    *   `Unknown`: If context is unclear or could be multiple things.
+3.  Determine the intended **severity** based on the original rule's phrasing:
+    *   `error`: If the rule uses strong prohibition words (e.g., "MUST NOT", "NEVER", "DON'T", "DISALLOW", "NO").
+    *   `warn`: If the rule uses softer suggestions (e.g., "AVOID", "PREFER NOT", "SHOULD NOT", "BE CAREFUL"). Default to `warn` if unclear.
+4.  If a simple rule still cannot be enforced by flagging specific syntax elements, return an empty flag list for it.
 
-Input Rule:
----
-{rule_text}
----
+Ensure each 'term' is accurately extracted (e.g., '==' not '===' if the rule is about banning '==').
 
-Respond ONLY with the JSON object.
+Output Format:
+Return ONLY a JSON object with a single key "results": a list containing exactly one entry per input rule. Each entry is an object with the following keys:
+- "index": The index of the input rule this entry describes (as given in the input list).
+- "outcome": A string, either "passed_through" (for simple rules), "translated" (if successfully broken down), "untranslatable", or "not_a_rule".
+- "refined_rules": A list of strings. Contains the original rule if "outcome" is "passed_through", or the list of new, simpler rule strings if "outcome" is "translated", or an empty list if "outcome" is "untranslatable" or "not_a_rule".
+- "flags_per_refined": A list with exactly one item per entry of "refined_rules", in the same order. Each item is a list of flag objects with the keys:
+    - "term": The specific keyword, literal, or operator string identified.
+    - "context": The determined syntactic context (e.g., "Identifier", "Literal", "Operator", "Keyword", "Property", "Import", "Unknown").
+    - "severity": The determined severity ("error" or "warn").
 """
 
-    json_schema = {
-        "name": "rule_translation_response",
-        "schema": {
-            "type": "object",
-            "properties": {
-                "outcome": {"type": "string", "enum": ["passed_through", "translated", "untranslatable"]},
-                "refined_rules": {"type": "array", "items": {"type": "string"}}
-            },
-            "required": ["outcome", "refined_rules"]
-        }
-    }
-
-    try:
-        response = client.chat.completions.create(
-            model=MODEL_NAME_REFINE,
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_schema", "json_schema": json_schema},
-            temperature=0.2, # Lower temperature for more deterministic translation
-            timeout=API_TIMEOUT_REFINE
-        )
-        result_json = json.loads(response.choices[0].message.content)
-        outcome = result_json.get("outcome", "untranslatable")
-        refined_list = result_json.get("refined_rules", [])
-
-        # Basic validation of response structure
-        if outcome == "passed_through" and not refined_list:
-            refined_list = [rule_text] # Ensure original rule is passed
-        elif outcome == "translated" and not refined_list:
-            outcome = "untranslatable" # If translated but list is empty, mark untranslatable
-        elif outcome == "untranslatable":
-             refined_list = [] # Ensure list is empty
-
-        return outcome, refined_list
-
-    except Exception as e:
-        tqdm.write(f"Error during rule translation/refinement for '{rule_text}': {e}")
-        # Fallback: Assume rule is simple and pass it through
-        return "passed_through", [rule_text]
+REFINE_AND_EXTRACT_EXAMPLES = """
+Example Input Rules:
+0: Use === instead of ==
+1: Do not hardcode API keys
+2: Tests should be easy to understand
+3: WE DONT USE FALLBACKS. EVER.
+4: ALWAYS VALIDATE implementation with the USER
+
+Example Output:
+{"results": [
+  {"index": 0, "outcome": "passed_through", "refined_rules": ["Use === instead of =="], "flags_per_refined": [
+    [ {"term": "==", "context": "Operator", "severity": "error"} ]
+  ]},
+  {"index": 1, "outcome": "translated", "refined_rules": ["Disallow string literals containing 'KEY'", "Flag assignments to variables named 'apiKey'"], "flags_per_refined": [
+    [ {"term": "KEY", "context": "Literal", "severity": "error"} ],
+    [ {"term": "apiKey", "context": "Identifier", "severity": "error"} ]
+  ]},
+  {"index": 2, "outcome": "untranslatable", "refined_rules": [], "flags_per_refined": []},
+  {"index": 3, "outcome": "translated", "refined_rules": ["Disallow the '||' operator", "Disallow the '??' operator", "Disallow identifiers named 'fallback'"], "flags_per_refined": [
+    [ {"term": "||", "context": "Operator", "severity": "error"} ],
+    [ {"term": "??", "context": "Operator", "severity": "error"} ],
+    [ {"term": "fallback", "context": "Identifier", "severity": "error"} ]
+  ]},
+  {"index": 4, "outcome": "not_a_rule", "refined_rules": [], "flags_per_refined": []}
+]}
+"""
 
-def llm_extract_flags(client, rule_text):
-    """
-    Calls OpenAI API to extract keywords/terms to flag from a rule description.
-    Returns a list of flag objects or an empty list on error/no flags.
-    """
-    prompt = f"""
-Analyze the following coding rule text. Your task is to identify specific keywords, string literals, operators, or patterns that should be flagged in code using ESLint's `no-restricted-syntax`.
+SYSTEM_PROMPT_REFINE_AND_EXTRACT = _system_prompt(REFINE_AND_EXTRACT_INSTRUCTIONS, REFINE_AND_EXTRACT_EXAMPLES, MODEL_NAME_REFINE)
 
-Input Rule: "{rule_text}"
+EXTRACT_INSTRUCTIONS = """
+Analyze each of the following coding rules independently. Your task is to identify specific keywords, string literals, operators, or patterns that should be flagged in code using ESLint's `no-restricted-syntax`.
 
-Instructions:
+Instructions (for every input rule):
 1.  Identify **specific, concrete terms** (keywords, variable names, function names, string literals, operators like '||', '??', '==') mentioned or clearly implied by the rule that should be disallowed or warned against.
 2.  For each term, determine its most likely **syntactic context**:
     *   `Identifier`: A variable name, function name, object key (e.g., `fallback`, `mockData`, `Math`).
@@ -207,87 +486,340 @@ Instructions:
 3.  Determine the intended **severity** based on the rule's phrasing:
     *   `error`: If the rule uses strong prohibition words (e.g., "MUST NOT", "NEVER", "DON'T", "DISALLOW", "NO").
     *   `warn`: If the rule uses softer suggestions (e.g., "AVOID", "PREFER NOT", "SHOULD NOT", "BE CAREFUL"). Default to `warn` if unclear.
-4.  If the rule is too vague, abstract, or clearly cannot be enforced by flagging specific syntax elements (e.g., "write good code", "validate with user"), return an empty list.
+4.  If a rule is too vague, abstract, or clearly cannot be enforced by flagging specific syntax elements (e.g., "write good code", "validate with user"), return an empty flag list for it.
 
 Output Format:
-Return ONLY a JSON object with a single key "flags". The value should be a list of objects, where each object represents a term to flag and has the following keys:
-- "term": The specific keyword, literal, or operator string identified.
-- "context": The determined syntactic context (e.g., "Identifier", "Literal", "Operator", "Keyword", "Property", "Import", "Unknown").
-- "severity": The determined severity ("error" or "warn").
-
-Example 1:
-Input Rule: "WE DONT USE FALLBACKS. EVER."
-Output: {{ "flags": [ {{ "term": "fallback", "context": "Identifier", "severity": "error" }}, {{ "term": "||", "context": "Operator", "severity": "error" }}, {{ "term": "??", "context": "Operator", "severity": "error" }} ] }}
-
-Example 2:
-Input Rule: "Avoid using Math.random()"
-Output: {{ "flags": [ {{ "term": "random", "context": "Property", "severity": "warn" }} ] }}
-
-Example 3:
-Input Rule: "No mock data in production code."
-Output: {{ "flags": [ {{ "term": "mock", "context": "Identifier", "severity": "error" }}, {{ "term": "dummy", "context": "Identifier", "severity": "error" }}, {{ "term": "/mocks/", "context": "Import", "severity": "error" }} ] }}
-
-Example 4:
-Input Rule: "Use === instead of =="
-Output: {{ "flags": [ {{ "term": "==", "context": "Operator", "severity": "error" }} ] }}
+Return ONLY a JSON object with a single key "results": a list containing exactly one entry per input rule. Each entry is an object with the following keys:
+- "index": The index of the input rule this entry describes (as given in the input list).
+- "flags": A list of objects, where each object represents a term to flag and has the following keys:
+    - "term": The specific keyword, literal, or operator string identified.
+    - "context": The determined syntactic context (e.g., "Identifier", "Literal", "Operator", "Keyword", "Property", "Import", "Unknown").
+    - "severity": The determined severity ("error" or "warn").
+
+Ensure each 'term' is accurately extracted (e.g., '==' not '===' if the rule is about banning '==').
+"""
 
-Example 5:
-Input Rule: "Latest model is gpt-4o"
-Output: {{ "flags": [ {{ "term": "gpt-4o", "context": "Literal", "severity": "warn" }} ] }} # Assuming rule implies 'flag other models'
+EXTRACT_EXAMPLES = """
+Example Input Rules:
+0: WE DONT USE FALLBACKS. EVER.
+1: Avoid using Math.random()
+2: No mock data in production code.
+3: Use === instead of ==
+4: Latest model is gpt-4o
+5: Be careful when writing tests
+
+Example Output:
+{"results": [
+  {"index": 0, "flags": [ {"term": "fallback", "context": "Identifier", "severity": "error"}, {"term": "||", "context": "Operator", "severity": "error"}, {"term": "??", "context": "Operator", "severity": "error"} ]},
+  {"index": 1, "flags": [ {"term": "random", "context": "Property", "severity": "warn"} ]},
+  {"index": 2, "flags": [ {"term": "mock", "context": "Identifier", "severity": "error"}, {"term": "dummy", "context": "Identifier", "severity": "error"}, {"term": "/mocks/", "context": "Import", "severity": "error"} ]},
+  {"index": 3, "flags": [ {"term": "==", "context": "Operator", "severity": "error"} ]},
+  {"index": 4, "flags": [ {"term": "gpt-4o", "context": "Literal", "severity": "warn"} ]},
+  {"index": 5, "flags": []}
+]}
+(Rule 4 assumes the rule implies 'flag other models'.)
+"""
 
-Example 6:
-Input Rule: "Be careful when writing tests"
-Output: {{ "flags": [] }}
+SYSTEM_PROMPT_EXTRACT = _system_prompt(EXTRACT_INSTRUCTIONS, EXTRACT_EXAMPLES, MODEL_NAME_EXTRACT)
+
+# Response formats are built once at import time and shared by every request
+REFINE_AND_EXTRACT_JSON_SCHEMA = {
+    "name": "refined_rule_flags_response",
+    "schema": {
+        "type": "object",
+        "properties": {
+            "results": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "index": {"type": "integer"},
+                        "outcome": {"type": "string", "enum": ["passed_through", "translated", "untranslatable", "not_a_rule"]},
+                        "refined_rules": {"type": "array", "items": {"type": "string"}},
+                        "flags_per_refined": {
+                            "type": "array",
+                            "items": {
+                                "type": "array",
+                                "items": {
+                                    "type": "object",
+                                    "properties": {
+                                        "term": {"type": "string"},
+                                        "context": {"type": "string", "enum": ["Identifier", "Literal", "Operator", "Keyword", "Property", "Import", "Unknown"]},
+                                        "severity": {"type": "string", "enum": ["error", "warn"]}
+                                    },
+                                    "required": ["term", "context", "severity"]
+                                }
+                            }
+                        }
+                    },
+                    "required": ["index", "outcome", "refined_rules", "flags_per_refined"]
+                }
+            }
+        },
+        "required": ["results"]
+    }
+}
+REFINE_AND_EXTRACT_RESPONSE_FORMAT = {"type": "json_schema", "json_schema": REFINE_AND_EXTRACT_JSON_SCHEMA}
+
+EXTRACT_JSON_SCHEMA = {
+    "name": "extracted_flags_response",
+    "schema": {
+        "type": "object",
+        "properties": {
+            "results": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "index": {"type": "integer"},
+                        "flags": {
+                            "type": "array",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "term": {"type": "string"},
+                                    "context": {"type": "string", "enum": ["Identifier", "Literal", "Operator", "Keyword", "Property", "Import", "Unknown"]},
+                                    "severity": {"type": "string", "enum": ["error", "warn"]}
+                                },
+                                "required": ["term", "context", "severity"]
+                            }
+                        }
+                    },
+                    "required": ["index", "flags"]
+                }
+            }
+        },
+        "required": ["results"]
+    }
+}
+EXTRACT_RESPONSE_FORMAT = {"type": "json_schema", "json_schema": EXTRACT_JSON_SCHEMA}
 
-Input Rule:
----
-{rule_text}
----
+def _build_batch_messages(system_prompt, rule_texts):
+    """
+    Builds chat messages for a batch request. The static instructions go in the system message and
+    only the indexed input rules go in the trailing user message, keeping the prompt prefix stable
+    so the provider's automatic prompt caching can reuse it.
+    """
+    indexed_rules = "\n".join(f"{i}: {rule}" for i, rule in enumerate(rule_texts))
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": f"Input Rules:\n---\n{indexed_rules}\n---\n\nRespond ONLY with the JSON object."}
+    ]
 
-Respond ONLY with the JSON object. Ensure the 'term' is accurately extracted (e.g., '==' not '===' if the rule is about banning '==').
-"""
+def _results_by_index(response, count):
+    """
+    Maps each entry of a validated batch response's "results" list to its in-batch index, as a
+    plain dict. Entries with an out-of-range or repeated index are dropped.
+    """
+    by_index = {}
+    for entry in response.results:
+        if 0 <= entry.index < count and entry.index not in by_index:
+            by_index[entry.index] = entry.model_dump()
+    return by_index
 
-    json_schema = {
-        "name": "extracted_flags_response",
-        "schema": {
-            "type": "object",
-            "properties": {
-                "flags": {
-                    "type": "array",
-                    "items": {
-                        "type": "object",
-                        "properties": {
-                            "term": {"type": "string"},
-                            "context": {"type": "string", "enum": ["Identifier", "Literal", "Operator", "Keyword", "Property", "Import", "Unknown"]},
-                            "severity": {"type": "string", "enum": ["error", "warn"]}
-                        },
-                        "required": ["term", "context", "severity"]
-                    }
-                }
-            },
-            "required": ["flags"]
-        }
+def _lookup_cached_results(model, system_prompt, temperature, rule_texts, results):
+    """
+    Looks up per-rule cached results for the positions of a batch that have no result yet (None).
+    Returns (cache_keys, cached) where cached maps position -> parsed cached entry.
+    """
+    cache_keys = [_cache_key_for(model, system_prompt + "\0" + rule, temperature) for rule in rule_texts]
+    cached = {}
+    for i, cache_key in enumerate(cache_keys):
+        content = response_cache.get(cache_key) if cache_key and results[i] is None else None
+        if content is not None:
+            cached[i] = json_loads(content)
+    return cache_keys, cached
+
+def _normalize_refine_entry(rule_text, entry):
+    """
+    Validates one fused result entry and returns an (outcome, refined_rules, flags_per_refined) tuple.
+    A flags item is None when the model did not return a usable flag list for that refined rule.
+    """
+    outcome = entry.get("outcome", "untranslatable")
+    refined_list = entry.get("refined_rules", [])
+
+    # Basic validation of response structure
+    if outcome not in ("passed_through", "translated", "untranslatable", "not_a_rule"):
+        outcome = "translated" if refined_list else "untranslatable" # Outcome outside the schema's enum
+    if outcome == "passed_through" and not refined_list:
+        refined_list = [rule_text] # Ensure original rule is passed
+    elif outcome == "translated" and not refined_list:
+        outcome = "untranslatable" # If translated but list is empty, mark untranslatable
+    elif outcome in ("untranslatable", "not_a_rule"):
+         refined_list = [] # Ensure list is empty
+
+    flags_list = entry.get("flags_per_refined")
+    if not isinstance(flags_list, list) or len(flags_list) != len(refined_list):
+        flags_list = [] # Flags no longer line up with the refined rules; re-extract them all
+    flags_per_refined = [flags if isinstance(flags, list) else None for flags in flags_list]
+    flags_per_refined += [None] * (len(refined_list) - len(flags_per_refined))
+    return outcome, refined_list, flags_per_refined
+
+def prepare_refine_and_extract(rule_texts):
+    """
+    Resolves every rule of a refine+extract batch that needs no LLM request: rules that
+    local_rules can already handle pass through with their local flags, and cached rules reuse
+    their cached result.
+    Returns (results, cache_keys), where results holds None for each rule still to be requested.
+    """
+    # A rule whose flags can be extracted locally is already simple, so it needs no refinement
+    results = []
+    for rule in rule_texts:
+        local_flags = try_local_extract(rule)
+        results.append(("passed_through", [rule], [local_flags]) if local_flags is not None else None)
+    cache_keys, cached = _lookup_cached_results(MODEL_NAME_REFINE, SYSTEM_PROMPT_REFINE_AND_EXTRACT, TEMPERATURE_REFINE, rule_texts, results)
+    for i, entry in cached.items():
+        results[i] = _normalize_refine_entry(rule_texts[i], entry)
+    return results, cache_keys
+
+def refine_and_extract_request(rule_texts):
+    """Returns the chat completion parameters for refining and extracting rule_texts in one request."""
+    return {
+        "model": MODEL_NAME_REFINE,
+        "messages": _build_batch_messages(SYSTEM_PROMPT_REFINE_AND_EXTRACT, rule_texts),
+        "response_format": REFINE_AND_EXTRACT_RESPONSE_FORMAT,
+        "temperature": TEMPERATURE_REFINE, # Lower temperature for more deterministic translation
+        "max_tokens": min(MAX_TOKENS_REFINE * len(rule_texts), MAX_OUTPUT_TOKENS) # Output budget scales with the batch
     }
 
+def record_refine_and_extract_response(rule_texts, results, pending, content):
+    """
+    Fills results at the pending positions from the content of the response to the request built
+    for those rules (None if the request failed).
+    Rules missing from the response pass through with their flags left as None.
+    Returns the positions the response answered; pass them to finish_refine_and_extract to cache them.
+    """
+    entries = {}
+    if content is not None:
+        try:
+            entries = _results_by_index(RefineAndExtractResponse.model_validate_json(content), len(pending))
+        except ValidationError as e:
+            _log_failure("Error parsing LLM refinement/extraction response for a batch of %s rules: %s. Response: %s", len(pending), e, content)
+
+    answered = []
+    for batch_index, i in enumerate(pending):
+        rule_text = rule_texts[i]
+        entry = entries.get(batch_index)
+        if entry is None:
+            # Fallback: Assume rule is simple and pass it through; its flags are extracted later
+            results[i] = ("passed_through", [rule_text], [None])
+            continue
+        results[i] = _normalize_refine_entry(rule_text, entry)
+        answered.append(i)
+    return answered
+
+async def finish_refine_and_extract(client, results, cache_keys=(), answered=()):
+    """
+    Extracts flags, via llm_extract_flags, for every refined rule in results that has none yet,
+    then caches the results at the answered positions (see record_refine_and_extract_response)
+    that are now complete, and converts every flag list in results from dicts into Flag tuples.
+    """
+    missing = [(i, j) for i, (_, _, flags_per_refined) in enumerate(results) for j, flags in enumerate(flags_per_refined) if flags is None]
+    if missing:
+        extracted = await llm_extract_flags(client, [results[i][1][j] for i, j in missing])
+        for (i, j), flags in zip(missing, extracted):
+            results[i][2][j] = flags
+    for i in answered:
+        # Only a complete entry is worth reusing
+        outcome, refined_list, flags_per_refined = results[i]
+        if cache_keys[i] and None not in flags_per_refined:
+            response_cache.set(
+                cache_keys[i],
+                json_dumps({"outcome": outcome, "refined_rules": refined_list, "flags_per_refined": flags_per_refined}),
+                ttl=CACHE_TTL_SECONDS
+            )
+    for _, _, flags_per_refined in results:
+        flags_per_refined[:] = [flags_from_dicts(flags or []) for flags in flags_per_refined]
+
+async def llm_refine_and_extract(client, rule_texts):
+    """
+    Refines a batch of rules into simpler rules and extracts the flags for each of them in a single
+    LLM request, instead of one refine request followed by one extract request.
+    Rules that local_rules can already handle, and rules already cached, skip the API. Refined rules
+    whose flags are missing from the response are sent to llm_extract_flags as a fallback.
+    Returns a list of (outcome, refined_rules, flags_per_refined) tuples aligned with rule_texts,
+    where flags_per_refined holds one list of Flag tuples per refined rule.
+    """
+    results, cache_keys = prepare_refine_and_extract(rule_texts)
+    pending = [i for i, result in enumerate(results) if result is None]
+
+    answered = []
+    if pending:
+        content = None
+        try:
+            response = await _create_completion(
+                client,
+                timeout=_timeout_for(API_TIMEOUT_REFINE, len(pending)),
+                **refine_and_extract_request([rule_texts[i] for i in pending])
+            )
+            content = response.choices[0].message.content
+        except Exception as e:
+            _log_failure("Error during rule refinement/extraction for a batch of %s rules: %s", len(pending), e)
+        answered = record_refine_and_extract_response(rule_texts, results, pending, content)
+
+    # Fill in any refined rules the fused response left without flags, then cache the completed entries
+    await finish_refine_and_extract(client, results, cache_keys, answered)
+    return results
+
+async def _extract_flags_batch(client, rule_texts, pending, results, cache_keys):
+    """
+    Requests the flags for the rules at the pending positions of rule_texts in a single request,
+    filling results and caching each answered rule. Rules left unanswered keep their None.
+    """
+    messages = _build_batch_messages(SYSTEM_PROMPT_EXTRACT, [rule_texts[i] for i in pending])
+    content = None
     try:
-        response = client.chat.completions.create(
+        response = await _create_completion(
+            client,
             model=MODEL_NAME_EXTRACT,
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_schema", "json_schema": json_schema},
-            temperature=0.1, # Low temperature for deterministic extraction
-            timeout=API_TIMEOUT_EXTRACT
+            messages=messages,
+            response_format=EXTRACT_RESPONSE_FORMAT,
+            temperature=TEMPERATURE_EXTRACT, # Low temperature for deterministic extraction
+            max_tokens=min(MAX_TOKENS_EXTRACT * len(pending), MAX_OUTPUT_TOKENS), # Output budget scales with the batch
+            timeout=_timeout_for(API_TIMEOUT_EXTRACT, len(pending))
         )
-        result = json.loads(response.choices[0].message.content)
-        # Basic validation
-        if isinstance(result, dict) and "flags" in result and isinstance(result["flags"], list):
-             return result["flags"]
-        else:
-            tqdm.write(f"Warning: LLM response for rule '{rule_text}' was malformed: {result}. Returning empty list.")
-            return [] # Return empty list on malformed response
-
-    except (json.JSONDecodeError, IndexError, AttributeError) as e:
-        tqdm.write(f"Error parsing LLM response for rule '{rule_text}': {e}. Response: {getattr(response, 'choices', [None])[0]}")
-        return [] # Return empty list on error
+        content = response.choices[0].message.content
+        entries = _results_by_index(ExtractResponse.model_validate_json(content), len(pending))
+    except (ValidationError, IndexError, AttributeError) as e:
+        _log_failure("Error parsing LLM response for a batch of %s rules: %s. Response: %s", len(pending), e, content)
+        return # Unanswered rules stay None on error
     except Exception as e:
-        tqdm.write(f"Error calling OpenAI API for rule '{rule_text}': {e}")
-        return [] # Return empty list on error 
\ No newline at end of file
+        _log_failure("Error calling OpenAI API for a batch of %s rules: %s", len(pending), e)
+        return # Unanswered rules stay None on error
+
+    for batch_index, i in enumerate(pending):
+        entry = entries.get(batch_index)
+        if entry is None:
+            logger.warning("Warning: LLM response for rule '%s' was missing from the batch response. Leaving it without flags.", rule_texts[i])
+            continue
+        results[i] = entry["flags"]
+        if cache_keys[i]:
+            response_cache.set(cache_keys[i], json_dumps({"flags": entry["flags"]}), ttl=CACHE_TTL_SECONDS)
+
+async def llm_extract_flags(client, rule_texts):
+    """
+    Calls the OpenAI API (async client) to extract keywords/terms to flag from a batch of rule descriptions.
+    Rules answerable locally (see local_rules.try_local_extract) or already cached skip the API;
+    all others are sent in concurrent requests of up to REFINE_BATCH_SIZE rules, so that even a
+    large input (such as every rule of a failed --batch run) keeps each response within its output cap.
+    Returns a list aligned with rule_texts; each item is a list of flag objects (empty if the rule has
+    no flags), or None if no answer could be obtained for the rule.
+    """
+    # Trivially simple rules are answered locally without an API call
+    results = [try_local_extract(rule) for rule in rule_texts]
+    cache_keys, cached = _lookup_cached_results(MODEL_NAME_EXTRACT, SYSTEM_PROMPT_EXTRACT, TEMPERATURE_EXTRACT, rule_texts, results)
+    for i, entry in cached.items():
+        results[i] = entry["flags"]
+    pending = [i for i, flags in enumerate(results) if flags is None]
+    if not pending:
+        return results
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+    async def _extract_limited(batch):
+        async with semaphore:
+            await _extract_flags_batch(client, rule_texts, batch, results, cache_keys)
+
+    batches = [pending[i:i + REFINE_BATCH_SIZE] for i in range(0, len(pending), REFINE_BATCH_SIZE)]
+    await asyncio.gather(*(_extract_limited(batch) for batch in batches))
+    return results
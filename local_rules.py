@@ -0,0 +1,82 @@
+import re
+
+# Deterministic patterns that can be turned into flags without asking the LLM
+RE_OPERATORS = re.compile(r"(===|!==|==|!=|\|\||\?\?)") # Longest operators first so '===' is not read as '=='
+RE_CONSOLE = re.compile(r"\bconsole\.(log|warn|error|debug)\b")
+RE_MATH_RANDOM = re.compile(r"\bMath\.random\b")
+RE_QUOTED_LITERAL = re.compile(r"""(?<!\w)['"]([^'"]{2,})['"](?!\w)""") # Skips apostrophes in words like "don't"
+
+# Same severity cues the extraction prompt uses: strong prohibitions are errors, everything else warns
+RE_STRONG_PROHIBITION = re.compile(r"\b(must not|mustn't|never|don'?t|do not|disallow|no)\b", re.IGNORECASE)
+# A term is only restricted locally when the rule prohibits something; softer prohibitions warn
+RE_WEAK_PROHIBITION = re.compile(r"\b(avoid|ban|banned|forbid|forbidden|prohibit|prohibited|restrict|should not|shouldn't)\b", re.IGNORECASE)
+# Rules phrased as recommendations may name the term they recommend, so they always go to the LLM
+RE_RECOMMENDATION = re.compile(r"\b(use|uses|using|prefer|always|instead|should)\b", re.IGNORECASE)
+# ...except for a negated "use", as in "Never use ==", which is itself the prohibition
+RE_NEGATED_USE = re.compile(r"\b(never|don'?t|do not|must not|mustn't|should not|shouldn't)\s+use\b", re.IGNORECASE)
+
+# A quoted term is only classified locally when the rule names exactly one kind of syntax for it
+QUOTED_TERM_CONTEXT_HINTS = {
+    "Import": re.compile(r"\b(imports?|paths?|modules?)\b", re.IGNORECASE),
+    "Identifier": re.compile(r"\b(identifiers?|variables?|named|functions?)\b", re.IGNORECASE),
+    "Literal": re.compile(r"\b(literals?|strings?|values?)\b", re.IGNORECASE),
+}
+
+# Lines that are never rules: blank lines, comments and markdown headers, section headers made of
+# words only ("General guidance:"), and short one-word headers ("Information:", "JS/TS:")
+_OBVIOUSLY_NOT_RULE = re.compile(r"^\s*(#|//|/\*|$)|^\s*[A-Z][a-zA-Z ]+:\s*$|^\s*[^\s:]{1,38}:\s*$")
+
+def local_prefilter(lines):
+    """
+    Sets aside lines that are obviously not rules (blank lines, comments, and section headers
+    like "Information:" or "General guidance:") so they are never sent to the filter LLM.
+    Returns (kept, filtered), both in input order.
+    """
+    kept = []
+    filtered = []
+    for line in lines:
+        if _OBVIOUSLY_NOT_RULE.match(line):
+            filtered.append(line)
+        else:
+            kept.append(line)
+    return kept, filtered
+
+def _quoted_term_context(rule_text):
+    contexts = [context for context, pattern in QUOTED_TERM_CONTEXT_HINTS.items() if pattern.search(rule_text)]
+    return contexts[0] if len(contexts) == 1 else None
+
+def try_local_extract(rule_text):
+    """
+    Answers trivially simple rules without an LLM call.
+    Returns a list with one flag object ({"term", "context", "severity"}) when the rule mentions
+    exactly one recognizable term (an operator, a console method, Math.random, or a quoted term
+    whose syntactic context the rule states) and prohibits it, or None if the rule needs the LLM.
+    Rules without a prohibition cue, or phrased as a recommendation ("use", "prefer", "always"),
+    are never answered locally: the term they mention may be the one they recommend.
+    """
+    strong = RE_STRONG_PROHIBITION.search(rule_text)
+    if not (strong or RE_WEAK_PROHIBITION.search(rule_text)) or RE_RECOMMENDATION.search(RE_NEGATED_USE.sub(" ", rule_text)):
+        return None
+
+    candidates = {} # term -> context
+    for match in RE_OPERATORS.finditer(rule_text):
+        candidates[match.group(1)] = "Operator"
+    for match in RE_CONSOLE.finditer(rule_text):
+        candidates[match.group(1)] = "Property"
+    if RE_MATH_RANDOM.search(rule_text):
+        candidates["random"] = "Property"
+
+    quoted_terms = [term for term in RE_QUOTED_LITERAL.findall(rule_text) if term not in candidates]
+    if quoted_terms:
+        # e.g. "Disallow the '||' operator" quotes a term already matched above
+        context = _quoted_term_context(rule_text)
+        if context is None:
+            return None
+        for term in quoted_terms:
+            candidates[term] = context
+
+    if len(candidates) != 1:
+        return None
+    (term, context), = candidates.items()
+    severity = "error" if strong else "warn"
+    return [{"term": term, "context": context, "severity": severity}]
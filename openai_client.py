@@ -0,0 +1,36 @@
+import os
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from config import MAX_CONCURRENT_REQUESTS, MAX_KEEPALIVE_CONNECTIONS, KEEPALIVE_EXPIRY
+
+try:
+    import h2 # noqa: F401 -- optional; lets httpx negotiate HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_client = None
+
+def get_client():
+    """
+    Returns the process-wide AsyncOpenAI client, creating it on first use.
+    The client owns one pooled httpx connection pool (HTTP/2 when `h2` is installed), so every
+    request reuses warm keep-alive connections instead of paying a fresh TLS handshake.
+    Raises ValueError if OPENAI_API_KEY is not set.
+    """
+    global _client
+    if _client is None:
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY environment variable not set.")
+        http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=MAX_CONCURRENT_REQUESTS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY
+            ),
+            http2=HTTP2_AVAILABLE
+        )
+        # Retries are handled by llm_interactions.llm_retry, so disable the client's own retry loop
+        _client = AsyncOpenAI(api_key=api_key, http_client=http_client, max_retries=0)
+    return _client
@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+class AdaptiveRateLimiter:
+    """
+    Paces requests to stay under the provider's rate limits. Wrap each request in
+    `async with limiter.slot():`.
+    - Token bucket: at most `requests_per_minute` requests start per minute, with bursts of up to
+      one second's worth.
+    - AIMD concurrency: at most `concurrency` requests are in flight. A request that fails with one
+      of `throttle_errors` (e.g. HTTP 429) halves the limit, once per congestion event: requests
+      that started before the last decrease were sent under the old limit, so their throttle
+      errors do not halve it again. Every `increase_after` consecutive successes raise the limit
+      by one again, up to `max_concurrency`.
+    Not thread-safe; intended for use from a single asyncio event loop.
+    """
+
+    def __init__(self, requests_per_minute, max_concurrency, throttle_errors=(), increase_after=10):
+        self.rate = requests_per_minute / 60.0
+        self.burst = max(1.0, self.rate)
+        self.max_concurrency = max_concurrency
+        self.concurrency = max_concurrency
+        self.throttle_errors = throttle_errors
+        self.increase_after = increase_after
+        self._tokens = self.burst
+        self._updated_at = time.monotonic()
+        self._in_flight = 0
+        self._successes = 0
+        self._decreases = 0 # Number of decreases so far; each request records the value it started under
+        self._condition = None # Created on first use, inside the running event loop
+
+    def slot(self):
+        """Returns an async context manager that holds one request slot while its body runs."""
+        return _RequestSlot(self)
+
+    def _take_token(self):
+        """Takes a token if one is available; otherwise returns the seconds until the next one."""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self.rate
+
+    async def _acquire(self):
+        """Waits for an in-flight slot and a token; returns the decrease count the request starts under."""
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < self.concurrency)
+            self._in_flight += 1
+        try:
+            delay = self._take_token()
+            while delay:
+                await asyncio.sleep(delay)
+                delay = self._take_token()
+        except BaseException:
+            await self._release()
+            raise
+        return self._decreases
+
+    def _record(self, started_under, exc_type):
+        """Adjusts the concurrency limit for the outcome of a request."""
+        if exc_type is None:
+            self._successes += 1
+            if self._successes >= self.increase_after and self.concurrency < self.max_concurrency:
+                self.concurrency += 1
+                self._successes = 0
+        elif issubclass(exc_type, self.throttle_errors):
+            self._successes = 0
+            if started_under == self._decreases:
+                self.concurrency = max(1, self.concurrency // 2)
+                self._decreases += 1
+
+    async def _release(self):
+        async with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+
+class _RequestSlot:
+    """One request's hold on an AdaptiveRateLimiter slot; see AdaptiveRateLimiter.slot."""
+
+    def __init__(self, limiter):
+        self._limiter = limiter
+        self._started_under = None
+
+    async def __aenter__(self):
+        self._started_under = await self._limiter._acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self._limiter._record(self._started_under, exc_type)
+        await self._limiter._release()
+        return False
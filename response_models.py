@@ -0,0 +1,55 @@
+import logging
+from typing import List, NamedTuple
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# Typed views of the JSON responses requested in llm_interactions. Parsing and validating a
+# response is a single model_validate_json call (pydantic-core parses the JSON itself), so a
+# malformed response surfaces as one pydantic.ValidationError.
+# The response formats are not strict, so the model can still answer outside the schema's enums.
+# Those fields are plain strings here so one odd value cannot reject a whole batch: unknown
+# contexts get the "Unknown" template, and only "error" raises the severity.
+
+class FlagEntry(BaseModel):
+    term: str
+    context: str = "Unknown"
+    severity: str = "warn"
+
+class FilterResponse(BaseModel):
+    lintable_rules: List[str] = []
+    filtered_out: List[str] = []
+    uncertain_lines: List[str] = [] # Only requested from the fast first-pass model
+
+class RefineAndExtractEntry(BaseModel):
+    index: int
+    outcome: str = "untranslatable" # passed_through / translated / untranslatable / not_a_rule
+    refined_rules: List[str] = []
+    flags_per_refined: List[List[FlagEntry]] = []
+
+class RefineAndExtractResponse(BaseModel):
+    results: List[RefineAndExtractEntry] = []
+
+class ExtractEntry(BaseModel):
+    index: int
+    flags: List[FlagEntry]
+
+class ExtractResponse(BaseModel):
+    results: List[ExtractEntry] = []
+
+class Flag(NamedTuple):
+    """A validated flag as used when generating configs; also usable directly as a dedupe key."""
+    term: str
+    context: str = "Unknown"
+    severity: str = "warn"
+
+def flags_from_dicts(flag_dicts):
+    """Converts flag dicts (from a response, the cache or local_rules) into Flag tuples, dropping any without a term."""
+    flags = []
+    for flag in flag_dicts:
+        term = flag.get("term")
+        if not term:
+            logger.warning("Warning: Flag missing 'term' in response. Flag: %s", flag)
+            continue
+        flags.append(Flag(term, flag.get("context", "Unknown"), flag.get("severity", "warn")))
+    return flags
@@ -1,119 +1,136 @@
-import concurrent.futures
-import os
-import traceback
+import asyncio
+import logging
+from collections import defaultdict
+from functools import lru_cache
 from tqdm import tqdm
-from config import KEYWORD_TEMPLATES, MAX_WORKERS
-from llm_interactions import llm_extract_flags
+from config import KEYWORD_SELECTORS, KEYWORD_MESSAGES, MAX_CONCURRENT_REQUESTS, REFINE_BATCH_SIZE
+from llm_interactions import llm_refine_and_extract
 
-def generate_eslint_config_object(term, context, rule_text):
-    """Generates a single ESLint config object based on the term, context, and template."""
-    # Escape potential special characters in term for selector/message
-    # Basic escaping for quotes; more complex terms might need more robust handling
-    # Escape for JS strings in message first
-    js_escaped_term = term.replace("\\", "\\\\").replace("'", "\\'").replace('"', '\\"')
-    js_escaped_rule_text = rule_text.replace("\\", "\\\\").replace("'", "\\'").replace('"', '\\"')
+logger = logging.getLogger(__name__)
+
+def chunk_list(items, size):
+    """Splits items into consecutive chunks of at most `size` elements."""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def rule_dedupe_key(rule):
+    """Key under which rules that differ only in whitespace (runs of spaces, tabs, surrounding) or case are processed once."""
+    return " ".join(rule.split()).casefold()
 
-    # Escape differently for AST selectors (single quotes usually ok unless term contains them)
-    selector_escaped_term = term.replace("'", "\\'") # Only escape single quotes for selector
+# Escape tables applied in a single pass: JS string contents (backslash and both quotes),
+# and AST selectors (single quotes usually ok unless term contains them)
+JS_ESCAPE_TABLE = str.maketrans({"\\": "\\\\", "'": "\\'", '"': '\\"'})
+SELECTOR_ESCAPE_TABLE = str.maketrans({"'": "\\'"})
 
-    template_func = KEYWORD_TEMPLATES.get(context, KEYWORD_TEMPLATES["Unknown"])
+# (selector template, message template) per context, resolved with a single lookup;
+# unknown contexts fall back to the "Unknown" pair
+CONTEXT_TEMPLATES = defaultdict(
+    lambda: (KEYWORD_SELECTORS["Unknown"], KEYWORD_MESSAGES["Unknown"]),
+    {context: (KEYWORD_SELECTORS[context], KEYWORD_MESSAGES[context]) for context in KEYWORD_SELECTORS}
+)
+
+@lru_cache(maxsize=8192)
+def _term_fields(term, context):
+    """
+    Returns (template fields for the term, selector) for a term in a context. Neither depends on
+    the rule text, so a term flagged by many rules is escaped and templated into a selector once.
+    """
+    selector_escaped_term = term.translate(SELECTOR_ESCAPE_TABLE)
+    fields = {"kw": selector_escaped_term, "kw_capitalized": selector_escaped_term.capitalize()}
+    return fields, CONTEXT_TEMPLATES[context][0] % fields
+
+def generate_eslint_config_object(term, context, rule_text, js_escaped_rule_text=None):
+    """
+    Generates a single ESLint config object based on the term, context, and template.
+    Callers generating several configs for one rule can pass its js_escaped_rule_text
+    (rule_text.translate(JS_ESCAPE_TABLE)) so it is escaped only once.
+    """
+    # Basic escaping for quotes; more complex terms might need more robust handling
+    if js_escaped_rule_text is None:
+        js_escaped_rule_text = rule_text.translate(JS_ESCAPE_TABLE)
 
     try:
-        # Pass the differently escaped terms to the template function
-        config_object = template_func(selector_escaped_term, js_escaped_rule_text)
-        return config_object
+        term_fields, selector = _term_fields(term, context)
+        return {
+            "selector": selector,
+            "message": CONTEXT_TEMPLATES[context][1] % dict(term_fields, rule=js_escaped_rule_text)
+        }
     except Exception as e:
-         tqdm.write(f"Error applying template for term '{term}' (context: {context}) from rule '{rule_text}': {e}")
+         logger.error("Error applying template for term '%s' (context: %s) from rule '%s': %s", term, context, rule_text, e, exc_info=logger.isEnabledFor(logging.DEBUG))
          return None # Indicate failure
 
-def process_refined_rule(client, rule_text):
+def generate_configs_for_flags(rule_text, extracted_flags, seen_flags=None):
     """
-    Processes a single refined rule: extracts flags and generates ESLint configs.
+    Generates ESLint configs for the flags extracted from one refined rule.
+    Flags (response_models.Flag tuples) already seen are skipped before template expansion;
+    pass the same seen_flags set for every rule to skip flags repeated across rules too.
     Returns a list of tuples: [(severity, config_object), ...].
     """
-    extracted_flags = llm_extract_flags(client, rule_text)
     generated_configs = []
-
-    if not extracted_flags:
-        return [] # Return empty list if LLM returns no flags or errors
-
+    if seen_flags is None:
+        seen_flags = set()
+    js_escaped_rule_text = rule_text.translate(JS_ESCAPE_TABLE) # Same for every flag of this rule
     for flag in extracted_flags:
-        term = flag.get("term")
-        context = flag.get("context", "Unknown")
-        severity = flag.get("severity", "warn") # Default to warn
-
-        if not term:
-            tqdm.write(f"Warning: Flag missing 'term' in response for rule '{rule_text}'. Flag: {flag}")
+        if flag in seen_flags:
             continue
+        seen_flags.add(flag)
 
-        config_object = generate_eslint_config_object(term, context, rule_text)
+        config_object = generate_eslint_config_object(flag.term, flag.context, rule_text, js_escaped_rule_text)
         if config_object:
-            generated_configs.append((severity, config_object))
+            generated_configs.append((flag.severity, config_object))
 
     return generated_configs
 
-def run_parallel_rule_processing(client, refined_rules):
+async def run_parallel_rule_refinement(client, rules, on_result=None):
     """
-    Processes refined rules in parallel to extract flags and generate configs.
-    Returns a list of all generated (severity, config_object) tuples.
+    Refines rules and extracts their flags as they arrive from the async iterable rules (such as
+    stream_filtered_rules), dispatching a batch as soon as REFINE_BATCH_SIZE rules have accumulated.
+    Batches run concurrently with at most MAX_CONCURRENT_REQUESTS in-flight LLM calls.
+    Rules that repeat an earlier one (ignoring whitespace differences and case) are not sent again;
+    they share the result of their first occurrence.
+    Returns a list of (rule, result) pairs in arrival order, where result is an
+    (outcome, refined_rules, flags_per_refined) tuple or the exception raised while processing that rule.
+    If given, on_result(rule, result) is called for each distinct rule as soon as its batch completes.
     """
-    print(f"\nProcessing {len(refined_rules)} final rules in parallel to extract flags...")
-    all_flag_configs = [] # Will store tuples of (severity, config_object)
-    futures = []
-    # Adjust num_workers based on typical LLM API latency vs CPU overhead
-    num_workers = min(MAX_WORKERS, (os.cpu_count() or 1) + 4)
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
-        # Submit tasks
-        for rule_text in refined_rules: # Use refined list
-            futures.append(executor.submit(process_refined_rule, client, rule_text))
-
-        print("\nExtracting flags and generating configs...")
-        # Process results as they complete
-        for future in tqdm(concurrent.futures.as_completed(futures), total=len(refined_rules), desc="Extracting Flags", unit="rule", position=0, leave=True):
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    tasks = []
+    arrived = [] # (rule, dedupe key) for every rule, in arrival order
+    seen_keys = set()
+
+    # The total is unknown up front; it grows as the filter stage produces rules
+    with tqdm(total=0, desc="Refining rules and extracting flags", unit="rule") as progress_bar:
+        async def _refine(batch):
             try:
-                # process_refined_rule returns a list of (severity, config_object) tuples
-                result_list = future.result()
-                if result_list:
-                    all_flag_configs.extend(result_list)
+                async with semaphore:
+                    results = await llm_refine_and_extract(client, batch)
             except Exception as exc:
-                # Log the error
-                tqdm.write(f'\nError retrieving result from future: {exc}')
-                tb_str = traceback.format_exc()
-                tqdm.write(f"Traceback:\n{tb_str}")
-
-    return all_flag_configs
-
-def aggregate_eslint_configs(all_flag_configs):
-    """
-    Aggregates individual flag configs into the final ESLint structure for 'no-restricted-syntax'.
-    Returns the final rules object and the highest severity level.
-    """
-    print(f"\nFinished processing. Aggregating {len(all_flag_configs)} flag configurations...")
-
-    # Build the final rules object for no-restricted-syntax
-    combined_syntax_configs = []
-    highest_severity = "warn" # Start with warn
-
-    # Combine configs, ensuring no duplicates and tracking highest severity
-    seen_selectors = set()
-    for severity, config in all_flag_configs:
-        selector = config.get("selector")
-        # Ensure config is a dictionary before proceeding
-        if isinstance(config, dict) and selector and selector not in seen_selectors:
-            combined_syntax_configs.append(config)
-            seen_selectors.add(selector)
-            if severity == "error":
-                highest_severity = "error" # Elevate overall severity if any flag is error
-        elif not isinstance(config, dict):
-             tqdm.write(f"Warning: Skipping invalid config object during aggregation: {config}")
-
-
-    final_rules_object = {}
-    rule_count = 0
-    if combined_syntax_configs:
-         # Format for no-restricted-syntax: [severity, option1, option2, ...]
-         final_rules_object["no-restricted-syntax"] = [highest_severity] + combined_syntax_configs
-         rule_count = len(combined_syntax_configs)
-
-    return final_rules_object, highest_severity, rule_count 
\ No newline at end of file
+                results = [exc] * len(batch)
+            if on_result:
+                for rule, result in zip(batch, results):
+                    on_result(rule, result)
+            progress_bar.update(len(batch))
+            return list(zip(batch, results))
+
+        def _dispatch(batch):
+            progress_bar.total += len(batch)
+            progress_bar.refresh()
+            tasks.append(asyncio.create_task(_refine(batch)))
+
+        batch = []
+        async for rule in rules:
+            key = rule_dedupe_key(rule)
+            arrived.append((rule, key))
+            if key in seen_keys:
+                continue
+            seen_keys.add(key)
+            batch.append(rule)
+            if len(batch) == REFINE_BATCH_SIZE:
+                _dispatch(batch)
+                batch = []
+        if batch:
+            _dispatch(batch)
+
+        batch_results = await asyncio.gather(*tasks)
+
+    # Map each result back to every position its rule appeared at
+    results_by_key = {rule_dedupe_key(rule): result for batch_result in batch_results for rule, result in batch_result}
+    return [(rule, results_by_key[key]) for rule, key in arrived]
@@ -0,0 +1,52 @@
+import json
+import re
+
+_decoder = json.JSONDecoder()
+
+class StringArrayStreamParser:
+    """
+    Incrementally extracts the string items of one JSON array (e.g. "lintable_rules") from a
+    JSON object whose text arrives in chunks, such as a streamed LLM response.
+    Raises ValueError if the array turns out to contain anything other than strings.
+    """
+
+    def __init__(self, key):
+        self._key_pattern = re.compile(r'"' + re.escape(key) + r'"\s*:\s*\[')
+        self._buffer = ""
+        self._pos = None # Index of the next unparsed character inside the array, once found
+        self.done = False
+
+    @property
+    def text(self):
+        """All text fed so far."""
+        return self._buffer
+
+    def feed(self, chunk):
+        """Adds a chunk of text and returns the array items completed by it (possibly none)."""
+        self._buffer += chunk
+        items = []
+        if self.done:
+            return items
+        if self._pos is None:
+            match = self._key_pattern.search(self._buffer)
+            if not match:
+                return items
+            self._pos = match.end()
+
+        while True:
+            # Skip separators between items
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in " \t\r\n,":
+                self._pos += 1
+            if self._pos >= len(self._buffer):
+                return items
+            char = self._buffer[self._pos]
+            if char == "]":
+                self.done = True
+                return items
+            if char != '"':
+                raise ValueError(f"Unexpected character {char!r} in streamed string array")
+            try:
+                item, self._pos = _decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                return items # The string is not complete yet; wait for more text
+            items.append(item)